@@ -1,12 +1,26 @@
-from fastapi import FastAPI, HTTPException, Depends
-from fastapi.responses import RedirectResponse
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Depends, Request, Response
+from fastapi.responses import ORJSONResponse, RedirectResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from starlette.background import BackgroundTask
+from pydantic import BaseModel
+from cachetools import TLRUCache
+from types import MappingProxyType
+from httpx_aiohttp import AiohttpTransport
+import aiohttp
 import httpx
+import asyncio
+import jwt
+import orjson
 import os
-from urllib.parse import urlencode
+import redis.asyncio as redis
+from urllib.parse import parse_qs, quote, urlencode, urlparse
 import secrets
+import sys
+import time
 from dotenv import load_dotenv
-import base64
+import pybase64
 
 load_dotenv()
 
@@ -15,7 +29,64 @@ GITHUB_CLIENT_ID = os.getenv("GITHUB_CLIENT_ID")
 GITHUB_CLIENT_SECRET = os.getenv("GITHUB_CLIENT_SECRET")
 GITHUB_REDIRECT_URI = os.getenv("GITHUB_REDIRECT_URI", "http://localhost:8000/auth/github/callback")
 FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:8501")
-app = FastAPI()
+
+# OAuth states are signed rather than stored, so any worker can verify them
+STATE_SECRET = os.getenv("STATE_SECRET")
+OAUTH_STATE_TTL = 600
+
+# Shared state store, so every uvicorn worker sees the same logins
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+USER_TOKEN_TTL = int(os.getenv("USER_TOKEN_TTL", 8 * 60 * 60))
+ETAG_CACHE_TTL = int(os.getenv("ETAG_CACHE_TTL", 24 * 60 * 60))
+
+# Directory listings are cached per commit, so a new commit is a natural cache miss
+HEAD_SHA_TTL = 60
+CONTENTS_CACHE_TTL = int(os.getenv("CONTENTS_CACHE_TTL", 60 * 60))
+
+# Per-worker cache of GitHub request headers, saving a Redis round-trip per request.
+# Entries hold (headers, monotonic deadline) and never outlive the user's Redis entry.
+AUTH_HEADERS_TTL = 300
+auth_headers_cache = TLRUCache(
+    maxsize=1024,
+    ttu=lambda _user_id, entry, now: min(now + AUTH_HEADERS_TTL, entry[1]),
+)
+
+# Query for /user/repos; GitHub caps per_page at 100
+REPOS_PARAMS = {"visibility": "all", "sort": "updated", "per_page": 100}
+
+# Base64 file payloads at least this long are decoded off the event loop
+OFFLOAD_DECODE_SIZE = 256 * 1024
+
+# Upper bound on concurrent GitHub requests fanned out by a single request
+# (tree crawls, repository pagination), to stay clear of secondary rate limits
+FANOUT_CONCURRENCY = 20
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Share pooled HTTP clients across requests so GitHub connections are kept alive"""
+    if not STATE_SECRET:
+        raise RuntimeError("STATE_SECRET must be set to sign OAuth states")
+    app.state.redis = redis.from_url(REDIS_URL, decode_responses=True)
+    # aiohttp's connection pool avoids httpcore's lock contention under fan-out (tree, pagination)
+    app.state.http = httpx.AsyncClient(
+        base_url="https://api.github.com",
+        transport=AiohttpTransport(client=lambda: aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=200, ttl_dns_cache=300, keepalive_timeout=30)
+        )),
+        timeout=httpx.Timeout(10.0, connect=5.0),
+    )
+    app.state.oauth = httpx.AsyncClient(
+        base_url="https://github.com",
+        timeout=httpx.Timeout(10.0, connect=5.0),
+    )
+    yield
+    await app.state.http.aclose()
+    await app.state.oauth.aclose()
+    await app.state.redis.aclose()
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 # Add CORS middleware
 app.add_middleware(
@@ -27,17 +98,226 @@ app.add_middleware(
 )
 
 
+class JSONGZipMiddleware(GZipMiddleware):
+    """Gzip API responses, but leave raw file streams alone
+
+    Raw files can be up to 100 MB and are often already compressed, so gzipping
+    them on the event loop would cost far more than it saves.
+    """
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].endswith("/raw"):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+
+# Compress JSON listings, which repeat long api.github.com URLs for every entry
+app.add_middleware(JSONGZipMiddleware, minimum_size=1024, compresslevel=6)
+
+
+def issue_state() -> str:
+    """Create a signed, short-lived OAuth state"""
+    claims = {"n": secrets.token_urlsafe(16), "exp": int(time.time()) + OAUTH_STATE_TTL}
+    return jwt.encode(claims, STATE_SECRET, algorithm="HS256")
+
+
+def verify_state(state: str) -> bool:
+    """Check an OAuth state's signature and expiry"""
+    try:
+        jwt.decode(state, STATE_SECRET, algorithms=["HS256"])
+    except jwt.InvalidTokenError:
+        return False
+    return True
+
+
+async def store_user(r: redis.Redis, user_id: int, access_token: str, user_info: str, repos: bytes = None):
+    """Store a user's token and raw JSON profile, optionally with a prefetched repo list"""
+    key = f"user:{user_id}"
+    mapping = {"access_token": access_token, "user_info": user_info}
+    if repos is not None:
+        mapping["repos_cache"] = repos
+
+    async with r.pipeline(transaction=True) as pipe:
+        pipe.delete(key)
+        pipe.hset(key, mapping=mapping)
+        pipe.expire(key, USER_TOKEN_TTL)
+        await pipe.execute()
+
+
+def json_passthrough(response: httpx.Response) -> Response:
+    """Relay a GitHub JSON body as-is, without decoding and re-encoding it"""
+    headers = {"ETag": response.headers["ETag"]} if "ETag" in response.headers else None
+    return Response(
+        content=response.content,
+        media_type="application/json",
+        status_code=response.status_code,
+        headers=headers,
+    )
+
+
+def build_auth_headers(access_token: str):
+    """Build the read-only GitHub API headers for a token"""
+    return MappingProxyType({
+        "Authorization": f"token {access_token}",
+        "Accept": "application/vnd.github+json",
+        "X-GitHub-Api-Version": "2022-11-28",
+    })
+
+
+async def get_auth_headers(r: redis.Redis, user_id: int):
+    """Get a user's GitHub API headers, loading the token from Redis on a cache miss"""
+    entry = auth_headers_cache.get(user_id)
+    if entry is None:
+        async with r.pipeline(transaction=True) as pipe:
+            pipe.hget(f"user:{user_id}", "access_token")
+            pipe.ttl(f"user:{user_id}")
+            access_token, ttl = await pipe.execute()
+        if not access_token:
+            raise HTTPException(status_code=401, detail="User not authenticated")
+        remaining = ttl if ttl > 0 else AUTH_HEADERS_TTL
+        entry = auth_headers_cache[user_id] = (build_auth_headers(access_token), time.monotonic() + remaining)
+    return entry[0]
+
+
+def splice_json_arrays(bodies) -> bytes:
+    """Concatenate raw JSON array bodies into one array without decoding them"""
+    items = (body.strip()[1:-1].strip() for body in bodies)
+    return b"[" + b",".join(item for item in items if item) + b"]"
+
+
+def decode_base64_text(encoded: str) -> str:
+    """Decode GitHub's line-wrapped base64 into UTF-8 text"""
+    return pybase64.b64decode(encoded, validate=False).decode("utf-8")
+
+
+async def load_user(r: redis.Redis, user_id: int) -> dict:
+    """Load a stored user or fail with 401"""
+    user = await r.hgetall(f"user:{user_id}")
+    if not user:
+        raise HTTPException(status_code=401, detail="User not authenticated")
+    return user
+
+
+async def github_get(request: Request, user_id: int, url: str, headers: dict, params: dict = None) -> httpx.Response:
+    """GET from the GitHub API, revalidating a cached copy with If-None-Match
+
+    GitHub answers an unchanged resource with a body-less 304 that does not count
+    against the rate limit, in which case the cached body is replayed as a 200.
+    Pass user_id=None to bypass the cache.
+    """
+    if user_id is None:
+        return await request.app.state.http.get(url, headers=headers, params=params)
+
+    r = request.app.state.redis
+    key = f"etag:{user_id}:{url}?{urlencode(params or {})}"
+    cached = await r.hgetall(key)
+    if cached:
+        headers = {**headers, "If-None-Match": cached["etag"]}
+
+    response = await request.app.state.http.get(url, headers=headers, params=params)
+
+    if response.status_code == 304 and cached:
+        replayed_headers = {"ETag": cached["etag"], "Content-Type": "application/json"}
+        if cached.get("link"):
+            replayed_headers["Link"] = cached["link"]
+        return httpx.Response(
+            200,
+            content=cached["body"].encode(),
+            headers=replayed_headers,
+            request=response.request,
+        )
+
+    if response.status_code == 200 and "ETag" in response.headers:
+        async with r.pipeline(transaction=True) as pipe:
+            pipe.hset(key, mapping={
+                "etag": response.headers["ETag"],
+                "link": response.headers.get("Link", ""),
+                "body": response.text,
+            })
+            pipe.expire(key, ETAG_CACHE_TTL)
+            await pipe.execute()
+
+    return response
+
+
+async def fetch_all_repos(request: Request, user_id: int, headers: dict):
+    """Fetch every page of the user's repositories as raw JSON, or None on failure
+
+    The first page's Link header gives the last page number, then the remaining
+    pages are requested concurrently.
+    """
+    first = await github_get(request, user_id, "/user/repos", headers=headers, params=REPOS_PARAMS)
+    if first.status_code != 200:
+        return None
+
+    last_url = first.links.get("last", {}).get("url")
+    if not last_url:
+        return first.content
+
+    last_page = int(parse_qs(urlparse(last_url).query)["page"][0])
+    sem = asyncio.Semaphore(FANOUT_CONCURRENCY)
+
+    async def fetch(page: int) -> httpx.Response:
+        async with sem:
+            return await github_get(request, user_id, "/user/repos", headers=headers, params={**REPOS_PARAMS, "page": page})
+
+    rest = await asyncio.gather(*(fetch(page) for page in range(2, last_page + 1)))
+    if any(page.status_code != 200 for page in rest):
+        return None
 
-# In-memory storage for demo (use proper database in production)
-user_tokens = {}
-auth_states = {}
+    return splice_json_arrays(page.content for page in (first, *rest))
+
+
+async def get_head_sha(request: Request, user_id: int, owner: str, repo: str, headers: dict):
+    """Resolve the default branch's HEAD commit, or None if it cannot be resolved"""
+    r = request.app.state.redis
+    key = f"head:{user_id}:{owner}/{repo}"
+    sha = await r.get(key)
+    if sha:
+        return sha
+
+    repo_response = await github_get(request, user_id, f"/repos/{owner}/{repo}", headers=headers)
+    if repo_response.status_code != 200:
+        return None
+
+    branch = orjson.loads(repo_response.content)["default_branch"]
+    sha_response = await request.app.state.http.get(
+        f"/repos/{owner}/{repo}/commits/{quote(branch)}",
+        headers={**headers, "Accept": "application/vnd.github.sha"}
+    )
+    # Empty repositories have no commits and answer 409
+    if sha_response.status_code != 200:
+        return None
+
+    sha = sha_response.text.strip()
+    await r.setex(key, HEAD_SHA_TTL, sha)
+    return sha
+
+
+async def get_contents(request: Request, user_id: int, owner: str, repo: str, path: str, headers: dict, sha: str):
+    """Get a contents listing at a commit, from Redis when it was already fetched"""
+    url = f"/repos/{owner}/{repo}/contents/{path}"
+    if sha is None:
+        return await github_get(request, user_id, url, headers=headers)
+
+    r = request.app.state.redis
+    key = f"contents:{owner}/{repo}:{sha}:{path}"
+    cached = await r.get(key)
+    if cached is not None:
+        return httpx.Response(200, content=cached.encode(), headers={"Content-Type": "application/json"})
+
+    # A listing pinned to a commit never changes, so skip ETag revalidation and its per-user copy
+    response = await request.app.state.http.get(url, headers=headers, params={"ref": sha})
+    if response.status_code == 200:
+        await r.setex(key, CONTENTS_CACHE_TTL, response.content)
+    return response
 
 
 @app.get("/auth/github")
 async def github_auth():
     """Initiate GitHub OAuth flow"""
-    state = secrets.token_urlsafe(32)
-    auth_states[state] = True
+    state = issue_state()
 
     params = {
         "client_id": GITHUB_CLIENT_ID,
@@ -52,9 +332,9 @@ async def github_auth():
 
 
 @app.get("/auth/github/callback")
-async def github_callback(code: str, state: str):
+async def github_callback(request: Request, code: str, state: str):
     """Handle GitHub OAuth callback"""
-    if state not in auth_states:
+    if not verify_state(state):
         raise HTTPException(status_code=400, detail="Invalid state")
 
     # Exchange code for access token
@@ -65,132 +345,193 @@ async def github_callback(code: str, state: str):
         "redirect_uri": GITHUB_REDIRECT_URI,
     }
 
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            "https://github.com/login/oauth/access_token",
-            data=token_data,
-            headers={"Accept": "application/json"}
-        )
+    response = await request.app.state.oauth.post(
+        "/login/oauth/access_token",
+        data=token_data,
+        headers={"Accept": "application/json"}
+    )
 
-        if response.status_code != 200:
-            raise HTTPException(status_code=400, detail="Failed to get access token")
+    if response.status_code != 200:
+        raise HTTPException(status_code=400, detail="Failed to get access token")
 
-        token_info = response.json()
-        access_token = token_info.get("access_token")
+    token_info = response.json()
+    access_token = token_info.get("access_token")
 
-        if not access_token:
-            raise HTTPException(status_code=400, detail="No access token received")
+    if not access_token:
+        raise HTTPException(status_code=400, detail="No access token received")
 
-        # Get user info
-        user_response = await client.get(
-            "https://api.github.com/user",
-            headers={"Authorization": f"token {access_token}"}
-        )
+    # Get user info and prefetch repositories concurrently
+    client = request.app.state.http
+    headers = build_auth_headers(access_token)
 
-        if user_response.status_code != 200:
-            raise HTTPException(status_code=400, detail="Failed to get user info")
+    async def prefetch_repos():
+        # Best effort: the code is single-use, so a failed prefetch must not fail the login
+        try:
+            return await fetch_all_repos(request, None, headers)
+        except httpx.HTTPError:
+            return None
 
-        user_info = user_response.json()
-        user_id = user_info["id"]
+    user_response, repos = await asyncio.gather(
+        client.get("/user", headers=headers),
+        prefetch_repos(),
+    )
 
-        # Store token
-        user_tokens[user_id] = {
-            "access_token": access_token,
-            "user_info": user_info
-        }
+    if user_response.status_code != 200:
+        raise HTTPException(status_code=400, detail="Failed to get user info")
 
-        # Clean up state
-        del auth_states[state]
+    user_info = user_response.json()
+    user_id = user_info["id"]
 
-        # Redirect to frontend with user_id
-        return RedirectResponse(f"{FRONTEND_URL}/?user_id={user_id}")
+    # Store token, warming the repository list so the first page load after login is instant
+    await store_user(request.app.state.redis, user_id, access_token, user_response.text, repos)
+    auth_headers_cache[user_id] = (headers, time.monotonic() + USER_TOKEN_TTL)
+
+    # Redirect to frontend with user_id
+    return RedirectResponse(f"{FRONTEND_URL}/?user_id={user_id}")
 
 
 @app.get("/user/{user_id}/repos")
-async def get_user_repos(user_id: int):
+async def get_user_repos(request: Request, user_id: int):
     """Get user's repositories (including private ones)"""
-    if user_id not in user_tokens:
-        raise HTTPException(status_code=401, detail="User not authenticated")
+    headers = await get_auth_headers(request.app.state.redis, user_id)
 
-    access_token = user_tokens[user_id]["access_token"]
+    # Serve the list prefetched at login once, then go back to GitHub
+    async with request.app.state.redis.pipeline(transaction=True) as pipe:
+        pipe.hget(f"user:{user_id}", "repos_cache")
+        pipe.hdel(f"user:{user_id}", "repos_cache")
+        repos_cache, _ = await pipe.execute()
+    if repos_cache is not None:
+        return Response(content=repos_cache, media_type="application/json")
 
-    async with httpx.AsyncClient() as client:
-        response = await client.get(
-            "https://api.github.com/user/repos",
-            headers={"Authorization": f"token {access_token}"},
-            params={"visibility": "all", "sort": "updated"}
-        )
-
-        if response.status_code != 200:
-            raise HTTPException(status_code=400, detail="Failed to fetch repositories")
+    repos = await fetch_all_repos(request, user_id, headers)
+    if repos is None:
+        raise HTTPException(status_code=400, detail="Failed to fetch repositories")
 
-        return response.json()
+    return Response(content=repos, media_type="application/json")
 
 
 @app.get("/user/{user_id}/repo/{owner}/{repo}/contents")
-async def get_repo_contents(user_id: int, owner: str, repo: str, path: str = ""):
+async def get_repo_contents(request: Request, user_id: int, owner: str, repo: str, path: str = ""):
     """Get contents of a repository"""
-    if user_id not in user_tokens:
-        raise HTTPException(status_code=401, detail="User not authenticated")
+    headers = await get_auth_headers(request.app.state.redis, user_id)
+    sha = await get_head_sha(request, user_id, owner, repo, headers)
+    response = await get_contents(request, user_id, owner, repo, path, headers, sha)
 
-    access_token = user_tokens[user_id]["access_token"]
+    if response.status_code != 200:
+        raise HTTPException(status_code=response.status_code, detail="Failed to fetch contents")
 
-    async with httpx.AsyncClient() as client:
-        url = f"https://api.github.com/repos/{owner}/{repo}/contents/{path}"
-        response = await client.get(
-            url,
-            headers={"Authorization": f"token {access_token}"}
-        )
+    return json_passthrough(response)
 
-        if response.status_code != 200:
-            raise HTTPException(status_code=response.status_code, detail="Failed to fetch contents")
 
-        return response.json()
+class TreeRequest(BaseModel):
+    paths: list[str]
 
 
-@app.get("/user/{user_id}/repo/{owner}/{repo}/file")
-async def get_file_content(user_id: int, owner: str, repo: str, path: str):
-    """Get decoded content of a specific file"""
-    if user_id not in user_tokens:
-        raise HTTPException(status_code=401, detail="User not authenticated")
+@app.post("/user/{user_id}/repo/{owner}/{repo}/tree")
+async def get_repo_tree(request: Request, user_id: int, owner: str, repo: str, tree_request: TreeRequest):
+    """Get contents of several repository paths at once, keyed by path"""
+    headers = await get_auth_headers(request.app.state.redis, user_id)
+    sha = await get_head_sha(request, user_id, owner, repo, headers)
+    sem = asyncio.Semaphore(FANOUT_CONCURRENCY)
 
-    access_token = user_tokens[user_id]["access_token"]
+    async def fetch(path: str) -> httpx.Response:
+        async with sem:
+            return await get_contents(request, user_id, owner, repo, path, headers, sha)
 
-    async with httpx.AsyncClient() as client:
-        url = f"https://api.github.com/repos/{owner}/{repo}/contents/{path}"
-        response = await client.get(
-            url,
-            headers={"Authorization": f"token {access_token}"}
-        )
+    paths = list(dict.fromkeys(tree_request.paths))
+    responses = await asyncio.gather(*(fetch(path) for path in paths))
 
+    for path, response in zip(paths, responses):
         if response.status_code != 200:
-            raise HTTPException(status_code=response.status_code, detail="Failed to fetch file")
+            raise HTTPException(status_code=response.status_code, detail=f"Failed to fetch contents of '{path}'")
+
+    # Splice GitHub's JSON bodies into one object without decoding them
+    body = b",".join(orjson.dumps(path) + b":" + response.content for path, response in zip(paths, responses))
+    return Response(content=b"{" + body + b"}", media_type="application/json")
 
-        file_data = response.json()
 
-        # Decode base64 content
-        if file_data.get("encoding") == "base64":
-            content = base64.b64decode(file_data["content"]).decode("utf-8")
-            return {
+@app.get("/user/{user_id}/repo/{owner}/{repo}/file")
+async def get_file_content(request: Request, user_id: int, owner: str, repo: str, path: str):
+    """Get decoded content of a specific file"""
+    headers = await get_auth_headers(request.app.state.redis, user_id)
+
+    client = request.app.state.http
+    url = f"/repos/{owner}/{repo}/contents/{path}"
+    response = await client.get(url, headers=headers)
+
+    if response.status_code != 200:
+        raise HTTPException(status_code=response.status_code, detail="Failed to fetch file")
+
+    file_data = orjson.loads(response.content)
+
+    # Decode base64 content
+    if file_data.get("encoding") == "base64":
+        encoded = file_data["content"]
+        if len(encoded) >= OFFLOAD_DECODE_SIZE:
+            content = await asyncio.to_thread(decode_base64_text, encoded)
+        else:
+            content = decode_base64_text(encoded)
+        return Response(
+            content=orjson.dumps({
                 "name": file_data["name"],
                 "path": file_data["path"],
                 "content": content,
                 "size": file_data["size"]
-            }
+            }),
+            media_type="application/json"
+        )
+
+    return json_passthrough(response)
+
+
+@app.get("/user/{user_id}/repo/{owner}/{repo}/raw")
+async def get_file_raw(request: Request, user_id: int, owner: str, repo: str, path: str):
+    """Stream the raw bytes of a file, skipping the JSON envelope and base64 decoding"""
+    headers = await get_auth_headers(request.app.state.redis, user_id)
+
+    client = request.app.state.http
+    github_request = client.build_request(
+        "GET",
+        f"/repos/{owner}/{repo}/contents/{path}",
+        headers={**headers, "Accept": "application/vnd.github.raw"}
+    )
+    response = await client.send(github_request, stream=True)
 
-        return file_data
+    if response.status_code != 200:
+        await response.aclose()
+        raise HTTPException(status_code=response.status_code, detail="Failed to fetch file")
+
+    # Pass the size through so clients can refuse large files before reading them;
+    # an encoded body is decoded by aiter_bytes, so its length would no longer match
+    stream_headers = {}
+    if "Content-Length" in response.headers and "Content-Encoding" not in response.headers:
+        stream_headers["Content-Length"] = response.headers["Content-Length"]
+
+    return StreamingResponse(
+        response.aiter_bytes(),
+        headers=stream_headers,
+        media_type=response.headers.get("Content-Type", "application/octet-stream"),
+        background=BackgroundTask(response.aclose),
+    )
 
 
 @app.get("/user/{user_id}/info")
-async def get_user_info(user_id: int):
+async def get_user_info(request: Request, user_id: int):
     """Get authenticated user info"""
-    if user_id not in user_tokens:
-        raise HTTPException(status_code=401, detail="User not authenticated")
-
-    return user_tokens[user_id]["user_info"]
+    user = await load_user(request.app.state.redis, user_id)
+    return Response(content=user["user_info"], media_type="application/json")
 
 
 if __name__ == "__main__":
     import uvicorn
 
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    uvicorn.run(
+        "fastapi_app:app",
+        host="0.0.0.0",
+        port=8000,
+        # uvloop has no Windows build
+        loop="uvloop" if sys.platform != "win32" else "asyncio",
+        http="httptools",
+        workers=os.cpu_count() or 1,
+        log_level="warning",
+    )
\ No newline at end of file
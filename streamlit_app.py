@@ -1,6 +1,9 @@
 import streamlit as st
 import requests
 import pandas as pd
+import orjson
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from urllib.parse import parse_qs, urlparse
 
 # Configure the page
@@ -9,6 +12,31 @@ st.set_page_config(page_title="GitHub Repository Explorer", layout="wide")
 # Backend URL
 BACKEND_URL = "http://localhost:8000"
 
+# How long backend responses are memoized across reruns, in seconds
+CACHE_TTL = 300
+
+# Largest file shown in the viewer, in bytes
+MAX_VIEW_SIZE = 1024 * 1024
+
+
+@st.cache_resource
+def _session():
+    """Pooled HTTP session shared by every rerun and browser session"""
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=10,
+        pool_maxsize=50,
+        max_retries=Retry(total=3, backoff_factor=0.2)
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def _json(response):
+    """Decode a backend JSON response with orjson"""
+    return orjson.loads(response.content)
+
 
 def init_session_state():
     """Initialize session state variables"""
@@ -18,14 +46,20 @@ def init_session_state():
         st.session_state.user_info = None
     if 'repos' not in st.session_state:
         st.session_state.repos = None
+    if 'repo_df' not in st.session_state:
+        st.session_state.repo_df = None
+    if 'repo_privacy' not in st.session_state:
+        st.session_state.repo_privacy = None
+    if 'viewed_file' not in st.session_state:
+        st.session_state.viewed_file = (None, None)
 
 
 def authenticate_github():
     """Initiate GitHub authentication"""
     try:
-        response = requests.get(f"{BACKEND_URL}/auth/github")
+        response = _session().get(f"{BACKEND_URL}/auth/github", timeout=10)
         if response.status_code == 200:
-            auth_data = response.json()
+            auth_data = _json(response)
             st.session_state.auth_url = auth_data["auth_url"]
             st.markdown(f"[🔐 Authenticate with GitHub]({auth_data['auth_url']})")
             st.info("Click the link above to authenticate with GitHub. You'll be redirected back here.")
@@ -35,15 +69,56 @@ def authenticate_github():
         st.error(f"Error connecting to backend: {e}")
 
 
+# Failed requests raise instead of returning, so errors are never cached
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def _cached_user_info(user_id):
+    response = _session().get(f"{BACKEND_URL}/user/{user_id}/info", timeout=10)
+    response.raise_for_status()
+    return _json(response)
+
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def _cached_repos(user_id):
+    response = _session().get(f"{BACKEND_URL}/user/{user_id}/repos", timeout=10)
+    response.raise_for_status()
+    return _json(response)
+
+
+@st.cache_resource
+def _contents_versions():
+    """Per-user generation of the contents cache, shared by every browser session"""
+    return {}
+
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def _cached_contents(user_id, owner, repo, path, version):
+    # version only keys the cache; stale generations age out after CACHE_TTL
+    response = _session().get(
+        f"{BACKEND_URL}/user/{user_id}/repo/{owner}/{repo}/contents",
+        params={"path": path},
+        timeout=10
+    )
+    response.raise_for_status()
+    return _json(response)
+
+
+def clear_user_cache(user_id):
+    """Drop memoized backend responses so the next rerun refetches them"""
+    _cached_user_info.clear(user_id)
+    _cached_repos.clear(user_id)
+    # cache_data can only clear one exact call or everything, and listings are
+    # keyed by path, so retire this user's entries rather than everyone's
+    versions = _contents_versions()
+    versions[user_id] = versions.get(user_id, 0) + 1
+
+
 def get_user_info(user_id):
     """Get authenticated user information"""
     try:
-        response = requests.get(f"{BACKEND_URL}/user/{user_id}/info")
-        if response.status_code == 200:
-            return response.json()
-        else:
-            st.error("Failed to get user information")
-            return None
+        return _cached_user_info(user_id)
+    except requests.HTTPError:
+        st.error("Failed to get user information")
+        return None
     except Exception as e:
         st.error(f"Error getting user info: {e}")
         return None
@@ -52,12 +127,10 @@ def get_user_info(user_id):
 def get_user_repos(user_id):
     """Get user's repositories"""
     try:
-        response = requests.get(f"{BACKEND_URL}/user/{user_id}/repos")
-        if response.status_code == 200:
-            return response.json()
-        else:
-            st.error("Failed to fetch repositories")
-            return None
+        return _cached_repos(user_id)
+    except requests.HTTPError:
+        st.error("Failed to fetch repositories")
+        return None
     except Exception as e:
         st.error(f"Error fetching repositories: {e}")
         return None
@@ -66,37 +139,91 @@ def get_user_repos(user_id):
 def get_repo_contents(user_id, owner, repo, path=""):
     """Get repository contents"""
     try:
-        response = requests.get(
-            f"{BACKEND_URL}/user/{user_id}/repo/{owner}/{repo}/contents",
-            params={"path": path}
-        )
-        if response.status_code == 200:
-            return response.json()
-        else:
-            st.error(f"Failed to fetch contents: {response.status_code}")
-            return None
+        version = _contents_versions().get(user_id, 0)
+        return _cached_contents(user_id, owner, repo, path, version)
+    except requests.HTTPError as e:
+        st.error(f"Failed to fetch contents: {e.response.status_code}")
+        return None
     except Exception as e:
         st.error(f"Error fetching contents: {e}")
         return None
 
 
+def _file_notice(path, notice):
+    """File result that is shown as a notice instead of its content"""
+    return {
+        "name": path.rsplit('/', 1)[-1],
+        "path": path,
+        "content": None,
+        "notice": notice,
+        "size": None
+    }
+
+
 def get_file_content(user_id, owner, repo, path):
-    """Get file content"""
+    """Get file content, or a notice instead of content for files too large or binary to show"""
     try:
-        response = requests.get(
-            f"{BACKEND_URL}/user/{user_id}/repo/{owner}/{repo}/file",
-            params={"path": path}
-        )
-        if response.status_code == 200:
-            return response.json()
-        else:
-            st.error(f"Failed to fetch file: {response.status_code}")
-            return None
+        # The raw endpoint streams files of any size, including those over
+        # 1 MB that GitHub's JSON contents API does not inline
+        with _session().get(
+            f"{BACKEND_URL}/user/{user_id}/repo/{owner}/{repo}/raw",
+            params={"path": path},
+            stream=True,
+            timeout=10
+        ) as response:
+            if response.status_code != 200:
+                st.error(f"Failed to fetch file: {response.status_code}")
+                return None
+
+            # Files can be up to 100 MB; refuse early when the size is known,
+            # otherwise stop reading as soon as the limit is passed
+            length = response.headers.get("Content-Length")
+            if length is not None and int(length) > MAX_VIEW_SIZE:
+                return _file_notice(path, f"{path} is too large to display ({int(length):,} bytes)")
+
+            data = bytearray()
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                data += chunk
+                if len(data) > MAX_VIEW_SIZE:
+                    return _file_notice(path, f"{path} is too large to display (over {MAX_VIEW_SIZE:,} bytes)")
+
+        # A NUL byte or invalid UTF-8 marks a binary file
+        content = None
+        if b"\0" not in data:
+            try:
+                content = data.decode("utf-8")
+            except UnicodeDecodeError:
+                pass
+        if content is None:
+            return _file_notice(path, f"{path} is a binary file and cannot be displayed")
+
+        return {
+            "name": path.rsplit('/', 1)[-1],
+            "path": path,
+            "content": content,
+            "notice": None,
+            "size": len(data)
+        }
     except Exception as e:
         st.error(f"Error fetching file: {e}")
         return None
 
 
+def build_repo_df(repos):
+    """Build the repository overview table"""
+    return pd.DataFrame([
+        {
+            'Name': repo['name'],
+            'Private': '🔒' if repo['private'] else '🔓',
+            'Language': repo.get('language', 'N/A'),
+            'Stars': repo.get('stargazers_count', 0),
+            'Updated': repo.get('updated_at', '').split('T')[0] if repo.get('updated_at') else 'N/A',
+            'Full Name': repo['full_name']
+        }
+        for repo in repos
+    ])
+
+
 def main():
     init_session_state()
 
@@ -131,9 +258,13 @@ def main():
         st.write(f"**Welcome, {st.session_state.user_info.get('name', st.session_state.user_info.get('login'))}!**")
         st.write(f"GitHub: @{st.session_state.user_info.get('login')}")
         if st.button("🔓 Logout"):
+            clear_user_cache(st.session_state.user_id)
             st.session_state.user_id = None
             st.session_state.user_info = None
             st.session_state.repos = None
+            st.session_state.repo_df = None
+            st.session_state.repo_privacy = None
+            st.session_state.viewed_file = (None, None)
             st.rerun()
 
     st.divider()
@@ -142,32 +273,29 @@ def main():
     st.header("📁 Your Repositories")
 
     if st.button("🔄 Refresh Repositories"):
+        clear_user_cache(st.session_state.user_id)
         st.session_state.repos = None
+        st.session_state.viewed_file = (None, None)
 
     if not st.session_state.repos:
         with st.spinner("Loading repositories..."):
             st.session_state.repos = get_user_repos(st.session_state.user_id)
+            # Build the table once per fetch rather than on every rerun
+            if st.session_state.repos:
+                st.session_state.repo_df = build_repo_df(st.session_state.repos)
+                st.session_state.repo_privacy = dict(
+                    zip(st.session_state.repo_df['Full Name'], st.session_state.repo_df['Private'])
+                )
 
     if st.session_state.repos:
-        # Create a DataFrame for better display
-        repo_data = []
-        for repo in st.session_state.repos:
-            repo_data.append({
-                'Name': repo['name'],
-                'Private': '🔒' if repo['private'] else '🔓',
-                'Language': repo.get('language', 'N/A'),
-                'Stars': repo.get('stargazers_count', 0),
-                'Updated': repo.get('updated_at', '').split('T')[0] if repo.get('updated_at') else 'N/A',
-                'Full Name': repo['full_name']
-            })
-
-        df = pd.DataFrame(repo_data)
+        df = st.session_state.repo_df
+        repo_privacy = st.session_state.repo_privacy
 
         # Repository selector
         selected_repo = st.selectbox(
             "Select a repository to explore:",
             options=df['Full Name'].tolist(),
-            format_func=lambda x: f"{x} {'🔒' if df[df['Full Name'] == x]['Private'].iloc[0] == '🔒' else '🔓'}"
+            format_func=lambda x: f"{x} {repo_privacy[x]}"
         )
 
         if selected_repo:
@@ -197,33 +325,47 @@ def main():
             )
 
             if contents:
-                # Display contents
-                for item in contents:
-                    col1, col2, col3 = st.columns([1, 6, 1])
-
-                    with col1:
-                        icon = "📁" if item['type'] == 'dir' else "📄"
-                        st.write(icon)
-
-                    with col2:
-                        st.write(f"**{item['name']}**")
-
-                    with col3:
-                        if item['type'] == 'dir':
-                            if st.button(f"Open", key=f"open_{item['path']}"):
-                                st.session_state.current_path = item['path']
-                                st.rerun()
+                # Display contents as one selectable table rather than a row of widgets per item
+                contents_df = pd.DataFrame([
+                    {'Type': "📁" if item['type'] == 'dir' else "📄", 'Name': item['name']}
+                    for item in contents
+                ])
+                event = st.dataframe(
+                    contents_df,
+                    hide_index=True,
+                    use_container_width=True,
+                    on_select="rerun",
+                    selection_mode="single-row",
+                    key=f"contents_{selected_repo}/{st.session_state.current_path}"
+                )
+                st.caption("Select a folder to open it or a file to view it.")
+
+                if event.selection.rows:
+                    item = contents[event.selection.rows[0]]
+                    if item['type'] == 'dir':
+                        st.session_state.current_path = item['path']
+                        st.rerun()
+                    else:
+                        # The selection survives reruns, so only download the
+                        # file when a different one is picked; failures are retried
+                        file_key = (st.session_state.user_id, selected_repo, item['path'])
+                        if st.session_state.viewed_file[0] == file_key:
+                            file_content = st.session_state.viewed_file[1]
                         else:
-                            if st.button(f"View", key=f"view_{item['path']}"):
-                                file_content = get_file_content(
-                                    st.session_state.user_id,
-                                    owner,
-                                    repo_name,
-                                    item['path']
-                                )
-                                if file_content:
-                                    st.subheader(f"📄 {file_content['name']}")
-                                    st.code(file_content['content'], language=None)
+                            file_content = get_file_content(
+                                st.session_state.user_id,
+                                owner,
+                                repo_name,
+                                item['path']
+                            )
+                            if file_content:
+                                st.session_state.viewed_file = (file_key, file_content)
+                        if file_content:
+                            st.subheader(f"📄 {file_content['name']}")
+                            if file_content['notice']:
+                                st.info(file_content['notice'])
+                            else:
+                                st.code(file_content['content'], language=None)
 
                 # Back button for navigation
                 if st.session_state.current_path: